@@ -3,63 +3,189 @@ Lambda Function: Data Processor
 Processes files from S3, transforms data, and stores results
 """
 
+import asyncio
+import base64
 import json
 import boto3
 import os
 from datetime import datetime
 import csv
+import gzip
 import io
+import queue
+import threading
 import uuid
 import traceback
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-# Initialize AWS clients
-s3_client = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+    pacsv = None
+
+try:
+    import aioboto3
+except ImportError:
+    aioboto3 = None
+
+from botocore.config import Config
+
+# Initialize AWS clients. The pool is sized for the parallel ranged
+# downloads and threaded record processing so fan-out never queues on
+# the default 10-connection pool, and keepalive avoids re-handshaking
+# TLS on warm invocations.
+BOTO_CONFIG = Config(
+    max_pool_connections=64,
+    tcp_keepalive=True,
+    retries={'mode': 'adaptive', 'max_attempts': 5}
+)
+
+s3_client = boto3.client('s3', config=BOTO_CONFIG)
+dynamodb = boto3.resource('dynamodb', config=BOTO_CONFIG)
 
 # Environment variables
 PROCESSED_BUCKET = os.environ['PROCESSED_BUCKET']
 METADATA_TABLE = os.environ['METADATA_TABLE']
 table = dynamodb.Table(METADATA_TABLE)
 
+# Objects larger than this are downloaded with parallel ranged GETs
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+
+# Total bytes the batch prefetch may hold at once; kept well under the
+# function's memory_size so a 100-record batch cannot exhaust it
+PREFETCH_BUDGET = 64 * 1024 * 1024
+
 def handler(event, context):
     """
     Main Lambda handler function
     Processes SQS messages containing S3 event notifications
     """
-    print(f"Received event with {len(event['Records'])} records")
-    
-    successful = 0
-    failed = 0
-    
-    for record in event['Records']:
+    records = event['Records']
+    print(f"Received event with {len(records)} records")
+
+    # Fan out all the small-object downloads for the batch with
+    # non-blocking I/O before processing starts
+    prefetched = prefetch_bodies(records) if aioboto3 is not None else {}
+
+    # Process SQS records concurrently so the per-file S3 and DynamoDB
+    # round-trips overlap within one invocation
+    with ThreadPoolExecutor(max_workers=min(10, len(records))) as executor:
+        results = list(executor.map(
+            lambda record: process_sqs_record(record, prefetched),
+            records
+        ))
+
+    failures = [
+        {'itemIdentifier': record['messageId']}
+        for record, succeeded in zip(records, results)
+        if not succeeded
+    ]
+
+    print(f"Processed {len(records) - len(failures)} records successfully, {len(failures)} failed")
+
+    # Partial-batch response: only the failed messages are redelivered
+    return {'batchItemFailures': failures}
+
+def process_sqs_record(record, prefetched=None):
+    """
+    Process a single SQS record; returns True only if every S3 event it
+    carries was processed successfully
+    """
+    try:
+        # Parse SQS message
+        message_body = json.loads(record['body'])
+
+        # Small files can arrive embedded in the message itself,
+        # skipping the S3 round-trip entirely
+        if message_body.get('inline'):
+            return process_inline_payload(message_body)
+
+        succeeded = True
+
+        # Handle S3 event notification
+        if 'Records' in message_body:
+            for s3_record in message_body['Records']:
+                if not process_s3_event(s3_record, prefetched):
+                    succeeded = False
+
+        return succeeded
+    except Exception as e:
+        print(f"Error processing record: {str(e)}")
+        print(traceback.format_exc())
+        return False
+
+def prefetch_bodies(records):
+    """
+    Download small S3 bodies referenced by the batch concurrently via
+    aioboto3, up to PREFETCH_BUDGET total bytes; returns
+    {(bucket, key): bytes}. Failures here are not fatal - missed
+    objects just take the per-record download path.
+    """
+    targets = []
+    budget = PREFETCH_BUDGET
+    for record in records:
         try:
-            # Parse SQS message
             message_body = json.loads(record['body'])
-            
-            # Handle S3 event notification
-            if 'Records' in message_body:
-                for s3_record in message_body['Records']:
-                    result = process_s3_event(s3_record)
-                    if result:
-                        successful += 1
-                    else:
-                        failed += 1
-        except Exception as e:
-            print(f"Error processing record: {str(e)}")
-            print(traceback.format_exc())
-            failed += 1
-    
+            if message_body.get('inline'):
+                continue
+            for s3_record in message_body.get('Records', []):
+                bucket_name = s3_record['s3']['bucket']['name']
+                object_key = s3_record['s3']['object']['key']
+                file_size = s3_record['s3']['object']['size']
+                # Large objects stay on the ranged-download path, and
+                # anything past the byte budget streams per record
+                if needs_content(object_key) and file_size <= MULTIPART_THRESHOLD and file_size <= budget:
+                    targets.append((bucket_name, object_key))
+                    budget -= file_size
+        except Exception:
+            # Malformed messages fail (and get reported) in their own
+            # process_sqs_record; prefetch must never fail the batch
+            continue
+
+    if not targets:
+        return {}
+
+    async def fetch_all():
+        async with aioboto3.Session().client('s3') as s3:
+            async def fetch(bucket, key):
+                response = await s3.get_object(Bucket=bucket, Key=key)
+                return await response['Body'].read()
+
+            return await asyncio.gather(
+                *[fetch(bucket, key) for bucket, key in targets],
+                return_exceptions=True
+            )
+
+    try:
+        bodies = asyncio.run(fetch_all())
+    except Exception as e:
+        print(f"Prefetch failed, falling back to per-record downloads: {str(e)}")
+        return {}
+
     return {
-        'statusCode': 200,
-        'body': json.dumps({
-            'successful': successful,
-            'failed': failed
-        })
+        target: body
+        for target, body in zip(targets, bodies)
+        if isinstance(body, (bytes, bytearray))
     }
 
-def process_s3_event(s3_record):
+def process_s3_event(s3_record, prefetched=None):
     """
-    Process a single S3 event record
+    Process a single S3 event record, using a prefetched body when the
+    batch download already pulled it
     """
     try:
         # Extract S3 details
@@ -71,34 +197,46 @@ def process_s3_event(s3_record):
         
         # Generate unique file ID
         file_id = str(uuid.uuid4())
-        
-        # Update DynamoDB with initial status
-        update_metadata(
-            file_id=file_id,
-            file_name=object_key,
-            status='PROCESSING',
-            file_size=file_size
-        )
-        
-        # Download and process file
-        response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
-        file_content = response['Body'].read().decode('utf-8')
-        
-        # Process the data (example: CSV processing)
-        processed_data = process_csv_data(file_content)
-        
-        # Generate output filename
-        output_key = generate_output_key(object_key)
+
+        if not needs_content(object_key):
+            # Metadata-only path: HeadObject returns the headers without
+            # transferring a single body byte
+            head = s3_client.head_object(Bucket=bucket_name, Key=object_key)
+            update_metadata(
+                file_id=file_id,
+                file_name=object_key,
+                status='SKIPPED',
+                file_size=head['ContentLength']
+            )
+            print(f"Recorded metadata only for non-CSV file: {object_key}")
+            return True
+
+        # Download and process file, streaming the body straight into the
+        # CSV parser so we never hold the whole object in memory.
+        # Large objects are fetched with parallel ranged GETs since a
+        # single-stream GET tops out well below Lambda's network budget.
+        # pop() releases the prefetched bytes as soon as this record owns
+        # them instead of pinning every body for the whole invocation
+        body_bytes = (prefetched or {}).pop((bucket_name, object_key), None)
+        if body_bytes is not None:
+            body = io.BytesIO(body_bytes)
+        elif file_size > MULTIPART_THRESHOLD:
+            body = ranged_download(bucket_name, object_key, file_size)
+        else:
+            body = s3_client.get_object(Bucket=bucket_name, Key=object_key)['Body']
+        try:
+            file_stream = io.TextIOWrapper(body, encoding='utf-8', newline='')
+            processed_data = process_csv_data(file_stream)
+        finally:
+            body.close()
         
         # Upload processed data to S3
-        s3_client.put_object(
-            Bucket=PROCESSED_BUCKET,
-            Key=output_key,
-            Body=json.dumps(processed_data, indent=2),
-            ContentType='application/json'
-        )
-        
-        # Update DynamoDB with success status
+        output_key = store_processed_output(processed_data, object_key)
+
+        # Record the terminal status in DynamoDB; a single write per file
+        # keeps one synchronous round-trip off the hot path. Any future
+        # row-level persistence should go through table.batch_writer()
+        # so puts are chunked into BatchWriteItem calls.
         update_metadata(
             file_id=file_id,
             file_name=object_key,
@@ -129,13 +267,170 @@ def process_s3_event(s3_record):
         
         return False
 
-def process_csv_data(csv_content):
+class _PartStream(io.RawIOBase):
     """
-    Process CSV data and perform transformations
+    Readable binary stream fed by a queue of downloaded object parts.
+    A None entry marks clean end-of-file; an exception entry is raised
+    to the reader so a failed part can never truncate the file silently.
+    """
+    def __init__(self, parts):
+        self._parts = parts
+        self._buffer = b''
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._done:
+            part = self._parts.get()
+            if part is None:
+                self._done = True
+            elif isinstance(part, BaseException):
+                self._done = True
+                raise part
+            else:
+                self._buffer = part
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+def process_inline_payload(message_body):
+    """
+    Process a small file whose bytes were base64-embedded in the SQS
+    message by the producer, avoiding any S3 GetObject
+    """
+    object_key = message_body.get('key', 'inline-payload.csv')
+
+    try:
+        content = base64.b64decode(message_body['content_b64'])
+        file_size = message_body.get('size', len(content))
+
+        print(f"Processing inline payload: {object_key}")
+
+        # Generate unique file ID
+        file_id = str(uuid.uuid4())
+
+        file_stream = io.TextIOWrapper(io.BytesIO(content), encoding='utf-8', newline='')
+        processed_data = process_csv_data(file_stream)
+
+        # Upload processed data to S3
+        output_key = store_processed_output(processed_data, object_key)
+
+        update_metadata(
+            file_id=file_id,
+            file_name=object_key,
+            status='COMPLETED',
+            file_size=file_size,
+            processed_key=output_key,
+            record_count=len(processed_data.get('records', []))
+        )
+
+        print(f"Successfully processed inline payload: {object_key}")
+        return True
+
+    except Exception as e:
+        print(f"Error processing inline payload: {str(e)}")
+        print(traceback.format_exc())
+        return False
+
+def store_processed_output(processed_data, object_key):
+    """
+    Upload processed data to S3, gzip-compressed: JSON with repeating
+    keys compresses 5-15x, shrinking the put and every downstream read
+    """
+    output_key = generate_output_key(object_key)
+
+    s3_client.put_object(
+        Bucket=PROCESSED_BUCKET,
+        Key=output_key,
+        Body=gzip.compress(serialize_json(processed_data), compresslevel=3),
+        ContentType='application/json',
+        ContentEncoding='gzip'
+    )
+
+    return output_key
+
+def needs_content(object_key):
+    """
+    Only CSV files have their bytes processed; other keys are recorded
+    from metadata alone
+    """
+    return object_key.lower().endswith('.csv')
+
+def ranged_download(bucket, key, size, part_size=8*1024*1024, concurrency=8):
+    """
+    Download an S3 object with parallel Range GETs and expose it as a
+    buffered binary stream for the CSV parser
+    """
+    ranges = [
+        (start, min(start + part_size, size) - 1)
+        for start in range(0, size, part_size)
+    ]
+    parts = queue.Queue(maxsize=concurrency)
+
+    # Pin every range to the ETag seen up front so a concurrent
+    # overwrite fails the download instead of splicing two versions
+    etag = s3_client.head_object(Bucket=bucket, Key=key)['ETag']
+
+    def fetch_range(byte_range):
+        start, end = byte_range
+        response = s3_client.get_object(
+            Bucket=bucket,
+            Key=key,
+            Range=f'bytes={start}-{end}',
+            IfMatch=etag
+        )
+        return response['Body'].read()
+
+    def produce():
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                # Keep at most `concurrency` ranges in flight and hand
+                # parts over in order. Submitting everything up front
+                # would buffer the whole object in completed futures
+                # whenever parsing is slower than downloading.
+                pending = deque()
+                next_range = 0
+                while next_range < len(ranges) and len(pending) < concurrency:
+                    pending.append(executor.submit(fetch_range, ranges[next_range]))
+                    next_range += 1
+
+                while pending:
+                    part = pending.popleft().result()
+                    # Start the replacement fetch before put() can block
+                    # on a full queue, so download overlaps parsing
+                    if next_range < len(ranges):
+                        pending.append(executor.submit(fetch_range, ranges[next_range]))
+                        next_range += 1
+                    parts.put(part)
+        except BaseException as e:
+            # Hand the failure to the reader; only clean completion may
+            # emit the EOF sentinel
+            parts.put(e)
+        else:
+            parts.put(None)
+
+    threading.Thread(target=produce, daemon=True).start()
+    return io.BufferedReader(_PartStream(parts))
+
+def process_csv_data(csv_file):
+    """
+    Process CSV data from a file-like object and perform transformations
     This is a simple example - customize based on your needs
     """
-    csv_reader = csv.DictReader(io.StringIO(csv_content))
-    
+    if pacsv is not None and pd is not None:
+        return process_csv_arrow(csv_file)
+    if pd is not None:
+        return process_csv_vectorized(csv_file)
+
+    csv_reader = csv.DictReader(csv_file)
+    row_ids = iter_row_ids()
+
+    # All rows in one invocation share the same processed_at; format it once
+    processed_at = datetime.utcnow().isoformat()
+
     records = []
     summary = {
         'total_records': 0,
@@ -155,8 +450,8 @@ def process_csv_data(csv_content):
             }
             
             # Add metadata
-            cleaned_row['processed_at'] = datetime.utcnow().isoformat()
-            cleaned_row['row_id'] = str(uuid.uuid4())
+            cleaned_row['processed_at'] = processed_at
+            cleaned_row['row_id'] = next(row_ids)
             
             records.append(cleaned_row)
             summary['valid_records'] += 1
@@ -176,15 +471,16 @@ def update_metadata(file_id, file_name, status, file_size,
     """
     Update file metadata in DynamoDB
     """
-    timestamp = int(datetime.utcnow().timestamp())
-    
+    now = datetime.utcnow()
+
     item = {
         'fileId': file_id,
         'fileName': file_name,
         'processingStatus': status,
-        'uploadTimestamp': timestamp,
+        'uploadTimestamp': int(now.timestamp()),
+        'day': now.strftime('%Y-%m-%d'),  # partition key of the ByDay GSI
         'fileSize': file_size,
-        'lastUpdated': datetime.utcnow().isoformat()
+        'lastUpdated': now.isoformat()
     }
     
     if processed_key:
@@ -199,6 +495,145 @@ def update_metadata(file_id, file_name, status, file_size,
     table.put_item(Item=item)
     print(f"Updated metadata for file: {file_name} with status: {status}")
 
+def generate_row_ids(count):
+    """
+    Generate `count` UUID-formatted row ids from one urandom read,
+    amortizing the syscall and skipping per-row UUID object construction
+    """
+    raw = os.urandom(16 * count)
+    row_ids = []
+    for i in range(count):
+        h = raw[i * 16:(i + 1) * 16].hex()
+        row_ids.append(f'{h[0:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:32]}')
+    return row_ids
+
+def iter_row_ids(batch_size=256):
+    """
+    Yield row ids indefinitely for streaming paths, drawing entropy in
+    batches of `batch_size`
+    """
+    while True:
+        yield from generate_row_ids(batch_size)
+
+def process_csv_arrow(csv_file):
+    """
+    Parse with pyarrow's multithreaded CSV reader (releases the GIL and
+    splits the input across cores), then run the shared vectorized cleanup
+    """
+    # Arrow parses bytes; reach through the TextIOWrapper when present
+    binary_file = getattr(csv_file, 'buffer', csv_file)
+
+    # Skip ragged rows and count them, like the streaming loop does,
+    # instead of failing the whole file into retries and the DLQ
+    invalid_count = [0]
+
+    def skip_invalid_row(row):
+        invalid_count[0] += 1
+        return 'skip'
+
+    try:
+        arrow_table = pacsv.read_csv(
+            binary_file,
+            read_options=pacsv.ReadOptions(use_threads=True, block_size=8 * 1024 * 1024),
+            parse_options=pacsv.ParseOptions(invalid_row_handler=skip_invalid_row)
+        )
+    except pa.ArrowInvalid as e:
+        # A zero-byte object must come out like the streaming path:
+        # COMPLETED with zero records, not FAILED into the DLQ
+        if 'Empty CSV file' in str(e):
+            return empty_csv_result()
+        raise
+
+    # Cast every column to string so all parse paths emit the same shapes
+    arrow_table = arrow_table.cast(
+        pa.schema([pa.field(field.name, pa.string()) for field in arrow_table.schema])
+    )
+
+    return finalize_dataframe(arrow_table.to_pandas(), invalid_count[0])
+
+def process_csv_vectorized(csv_file):
+    """
+    Vectorized variant of process_csv_data: pandas does the whitespace
+    cleanup in C kernels instead of a per-row Python dict comprehension
+    """
+    try:
+        # Skip ragged rows instead of failing the file; the C parser
+        # announces each skipped line with a ParserWarning we can count
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always', pd.errors.ParserWarning)
+            df = pd.read_csv(csv_file, dtype=str, on_bad_lines='warn')
+    except pd.errors.EmptyDataError:
+        # A zero-byte object must come out like the streaming path:
+        # COMPLETED with zero records, not FAILED into the DLQ
+        return empty_csv_result()
+
+    invalid_records = sum(
+        str(w.message).count('Skipping line')
+        for w in caught
+        if issubclass(w.category, pd.errors.ParserWarning)
+    )
+    return finalize_dataframe(df, invalid_records)
+
+def empty_csv_result():
+    """
+    Result for a file with no rows, matching what the streaming path
+    produces for empty input
+    """
+    return {
+        'summary': {
+            'total_records': 0,
+            'valid_records': 0,
+            'invalid_records': 0
+        },
+        'records': [],
+        'processed_timestamp': datetime.utcnow().isoformat()
+    }
+
+def finalize_dataframe(df, invalid_records=0):
+    """
+    Shared vectorized cleanup: strip headers and values, fill blanks,
+    and attach per-row metadata
+    """
+    valid_records = len(df)
+
+    df.columns = df.columns.str.strip()
+    for col in df.columns:
+        df[col] = df[col].str.strip()
+    df = df.fillna('')
+
+    # Add metadata
+    df['processed_at'] = datetime.utcnow().isoformat()
+    df['row_id'] = generate_row_ids(valid_records)
+
+    return {
+        'summary': {
+            'total_records': valid_records + invalid_records,
+            'valid_records': valid_records,
+            'invalid_records': invalid_records
+        },
+        'records': df.to_dict(orient='records'),
+        'processed_timestamp': datetime.utcnow().isoformat()
+    }
+
+def serialize_json(obj):
+    """
+    Serialize to pretty-printed JSON bytes, preferring the C-implemented
+    orjson over the pure-Python stdlib encoder
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            obj,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+            default=json_default
+        )
+    return json.dumps(obj, indent=2, default=json_default).encode('utf-8')
+
+def json_default(obj):
+    """Helper function to serialize datetime objects as ISO strings"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError
+
 def generate_output_key(input_key):
     """
     Generate output S3 key based on input key
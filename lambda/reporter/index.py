@@ -5,15 +5,43 @@ Generates daily summary reports from processed data
 
 import json
 import boto3
+import gzip
+import heapq
+import io
 import os
+import time
 from datetime import datetime, timedelta
 from decimal import Decimal
-from boto3.dynamodb.conditions import Key, Attr
+from html import escape
+from string import Template
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 
-# Initialize AWS clients
-s3_client = boto3.client('s3')
-sns_client = boto3.client('sns')
-dynamodb = boto3.resource('dynamodb')
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from botocore.config import Config
+
+# Initialize AWS clients. The pool is sized for the parallel Scan
+# segments and concurrent report uploads, and keepalive avoids
+# re-handshaking TLS on warm invocations.
+BOTO_CONFIG = Config(
+    max_pool_connections=64,
+    tcp_keepalive=True,
+    retries={'mode': 'adaptive', 'max_attempts': 5}
+)
+
+s3_client = boto3.client('s3', config=BOTO_CONFIG)
+sns_client = boto3.client('sns', config=BOTO_CONFIG)
+dynamodb_client = boto3.client('dynamodb', config=BOTO_CONFIG)
+
+# The low-level client returns raw attribute values; deserializing them
+# through to_native avoids the Decimal objects the resource-layer Table
+# hydrates for every number
+DESERIALIZER = TypeDeserializer()
 
 # Environment variables
 REPORTS_BUCKET = os.environ['REPORTS_BUCKET']
@@ -21,7 +49,34 @@ METADATA_TABLE = os.environ['METADATA_TABLE']
 SNS_TOPIC_ARN = os.environ['SNS_TOPIC_ARN']
 ENVIRONMENT = os.environ['ENVIRONMENT']
 
-table = dynamodb.Table(METADATA_TABLE)
+# GSI keyed on the 'day' date bucket with uploadTimestamp as sort key
+DAY_INDEX = 'ByDay'
+
+# Number of segments for the parallel Scan fallback
+SCAN_SEGMENTS = 8
+
+# Only the attributes generate_report actually reads; projecting them
+# cuts transfer and deserialization cost on every query/scan page
+REPORT_PROJECTION = '#st, #rc, #fs, #ts, #em, #fn'
+REPORT_ATTRIBUTE_NAMES = {
+    '#st': 'processingStatus',
+    '#rc': 'recordCount',
+    '#fs': 'fileSize',
+    '#ts': 'uploadTimestamp',
+    '#em': 'errorMessage',
+    '#fn': 'fileName'
+}
+
+# Optional: set EXPORT_BUCKET to aggregate from a DynamoDB export-to-S3
+# instead of querying/scanning the live table. On tables with millions
+# of items the scan path can exceed the 15-minute Lambda cap; the
+# native exporter runs outside the function and consumes no RCUs.
+# Prerequisites: point-in-time recovery on the table (enabled in
+# main.tf) and a role with dynamodb:ExportTableToPointInTime,
+# dynamodb:DescribeExport, and s3:GetObject/PutObject on the bucket.
+EXPORT_BUCKET = os.environ.get('EXPORT_BUCKET', '')
+EXPORT_POLL_SECONDS = 15
+EXPORT_TIMEOUT_SECONDS = 600
 
 def handler(event, context):
     """
@@ -77,67 +132,240 @@ def fetch_report_data(start_time, end_time):
     """
     start_timestamp = int(start_time.timestamp())
     end_timestamp = int(end_time.timestamp())
-    
-    # Scan table for records in time range
-    response = table.scan(
-        FilterExpression=Attr('uploadTimestamp').between(start_timestamp, end_timestamp)
-    )
-    
-    items = response.get('Items', [])
-    
-    # Handle pagination
-    while 'LastEvaluatedKey' in response:
-        response = table.scan(
-            FilterExpression=Attr('uploadTimestamp').between(start_timestamp, end_timestamp),
-            ExclusiveStartKey=response['LastEvaluatedKey']
-        )
-        items.extend(response.get('Items', []))
-    
+
+    if EXPORT_BUCKET:
+        try:
+            items = fetch_via_export(start_timestamp, end_timestamp)
+            print(f"Fetched {len(items)} records from table export")
+            return items
+        except Exception as e:
+            print(f"Table export path failed ({e}), falling back to query/scan")
+
+    try:
+        # Query the ByDay GSI so we only read items in the report window
+        items = query_by_day(start_time, end_time, start_timestamp, end_timestamp)
+    except ClientError as e:
+        # Tables deployed before the GSI existed fall back to a full scan
+        print(f"Query on {DAY_INDEX} index failed ({e.response['Error']['Code']}), falling back to scan")
+        items = scan_table(start_timestamp, end_timestamp)
+
     print(f"Fetched {len(items)} records from DynamoDB")
     return items
 
+def fetch_via_export(start_timestamp, end_timestamp):
+    """
+    Export the table to S3 with DynamoDB's native parallel exporter and
+    stream the exported items back, keeping only those in the window
+    """
+    table_arn = dynamodb_client.describe_table(TableName=METADATA_TABLE)['Table']['TableArn']
+
+    export = dynamodb_client.export_table_to_point_in_time(
+        TableArn=table_arn,
+        S3Bucket=EXPORT_BUCKET,
+        S3Prefix='exports/',
+        ExportFormat='DYNAMODB_JSON'
+    )['ExportDescription']
+
+    # Wait for the export to finish, with a hard deadline well inside
+    # the Lambda timeout
+    deadline = time.time() + EXPORT_TIMEOUT_SECONDS
+    while export['ExportStatus'] == 'IN_PROGRESS':
+        if time.time() > deadline:
+            raise TimeoutError('DynamoDB export did not complete in time')
+        time.sleep(EXPORT_POLL_SECONDS)
+        export = dynamodb_client.describe_export(
+            ExportArn=export['ExportArn']
+        )['ExportDescription']
+
+    if export['ExportStatus'] != 'COMPLETED':
+        raise RuntimeError(f"DynamoDB export ended in status {export['ExportStatus']}")
+
+    # The summary manifest points at the file manifest, which lists the
+    # gzipped DYNAMODB_JSON data objects
+    summary = json.loads(
+        s3_client.get_object(Bucket=EXPORT_BUCKET, Key=export['ExportManifest'])['Body'].read()
+    )
+    files_body = s3_client.get_object(
+        Bucket=EXPORT_BUCKET, Key=summary['manifestFilesS3Key']
+    )['Body']
+
+    items = []
+
+    for manifest_line in io.TextIOWrapper(files_body, encoding='utf-8'):
+        manifest_line = manifest_line.strip()
+        if not manifest_line:
+            continue
+        data_key = json.loads(manifest_line)['dataFileS3Key']
+        data_body = s3_client.get_object(Bucket=EXPORT_BUCKET, Key=data_key)['Body']
+
+        with gzip.open(data_body, mode='rt', encoding='utf-8') as data_lines:
+            for line in data_lines:
+                item = deserialize_item(json.loads(line)['Item'])
+                timestamp = int(item.get('uploadTimestamp', 0))
+                if start_timestamp <= timestamp <= end_timestamp:
+                    items.append(item)
+
+    return items
+
+def query_by_day(start_time, end_time, start_timestamp, end_timestamp):
+    """
+    Query the ByDay GSI for each day bucket overlapping the time range
+    """
+    items = []
+    day = start_time.date()
+
+    while day <= end_time.date():
+        query_kwargs = {
+            'TableName': METADATA_TABLE,
+            'IndexName': DAY_INDEX,
+            'KeyConditionExpression': '#day = :day AND #ts BETWEEN :start AND :end',
+            'ProjectionExpression': REPORT_PROJECTION,
+            'ExpressionAttributeNames': {**REPORT_ATTRIBUTE_NAMES, '#day': 'day'},
+            'ExpressionAttributeValues': {
+                ':day': {'S': day.strftime('%Y-%m-%d')},
+                ':start': {'N': str(start_timestamp)},
+                ':end': {'N': str(end_timestamp)}
+            }
+        }
+
+        while True:
+            response = dynamodb_client.query(**query_kwargs)
+            items.extend(deserialize_item(item) for item in response.get('Items', []))
+
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        day += timedelta(days=1)
+
+    return items
+
+def scan_table(start_timestamp, end_timestamp):
+    """
+    Parallel Scan of the table for records in the time range, with each
+    worker paginating its own segment
+    """
+    with ThreadPoolExecutor(max_workers=SCAN_SEGMENTS) as executor:
+        futures = [
+            executor.submit(scan_segment, segment, start_timestamp, end_timestamp)
+            for segment in range(SCAN_SEGMENTS)
+        ]
+        items = []
+        for future in futures:
+            items.extend(future.result())
+
+    return items
+
+def scan_segment(segment, start_timestamp, end_timestamp):
+    """
+    Scan a single segment of the table, handling pagination
+    """
+    scan_kwargs = {
+        'TableName': METADATA_TABLE,
+        'Segment': segment,
+        'TotalSegments': SCAN_SEGMENTS,
+        'FilterExpression': '#ts BETWEEN :start AND :end',
+        'ProjectionExpression': REPORT_PROJECTION,
+        'ExpressionAttributeNames': REPORT_ATTRIBUTE_NAMES,
+        'ExpressionAttributeValues': {
+            ':start': {'N': str(start_timestamp)},
+            ':end': {'N': str(end_timestamp)}
+        }
+    }
+
+    items = []
+    while True:
+        response = dynamodb_client.scan(**scan_kwargs)
+        items.extend(deserialize_item(item) for item in response.get('Items', []))
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    return items
+
+def deserialize_item(item):
+    """
+    Convert a raw DynamoDB item into a plain dict with native Python
+    numbers
+    """
+    return {
+        key: to_native(DESERIALIZER.deserialize(value))
+        for key, value in item.items()
+    }
+
+def to_native(value):
+    """Collapse the deserializer's Decimal values to int or float"""
+    if isinstance(value, Decimal):
+        return int(value) if value == int(value) else float(value)
+    return value
+
 def generate_report(data, start_time, end_time):
     """
     Generate comprehensive report from data
     """
-    # Initialize counters
+    # Aggregate everything in a single pass over the data
     total_files = len(data)
-    completed_files = sum(1 for item in data if item.get('processingStatus') == 'COMPLETED')
-    failed_files = sum(1 for item in data if item.get('processingStatus') == 'FAILED')
-    processing_files = sum(1 for item in data if item.get('processingStatus') == 'PROCESSING')
-    
-    total_records = sum(int(item.get('recordCount', 0)) for item in data if item.get('recordCount'))
-    total_size_bytes = sum(int(item.get('fileSize', 0)) for item in data)
+    completed_files = 0
+    failed_files = 0
+    processing_files = 0
+    total_records = 0
+    total_size_bytes = 0
+    hourly_stats = {}
+    hour_label_cache = {}
+    errors = []
+    # Min-heap of (recordCount, index, fileName) capped at 10; the index
+    # breaks count ties so file names are never compared
+    top_heap = []
+
+    for index, item in enumerate(data):
+        status = item.get('processingStatus')
+        record_count = item.get('recordCount')
+        timestamp = int(item.get('uploadTimestamp', 0))
+
+        if status == 'COMPLETED':
+            completed_files += 1
+        elif status == 'FAILED':
+            failed_files += 1
+            if item.get('errorMessage'):
+                errors.append({
+                    'fileName': item.get('fileName', 'Unknown'),
+                    'error': item.get('errorMessage', 'No error message'),
+                    'timestamp': datetime.fromtimestamp(timestamp).isoformat()
+                })
+        elif status == 'PROCESSING':
+            processing_files += 1
+
+        if record_count:
+            count = int(record_count)
+            total_records += count
+            entry = (count, index, item.get('fileName'))
+            if len(top_heap) < 10:
+                heapq.heappush(top_heap, entry)
+            elif entry > top_heap[0]:
+                heapq.heapreplace(top_heap, entry)
+
+        total_size_bytes += int(item.get('fileSize', 0))
+
+        # Group by hour; bucket on the integer hour and only format the
+        # label the first time a bucket appears
+        hour_key = timestamp // 3600
+        hour = hour_label_cache.get(hour_key)
+        if hour is None:
+            hour = datetime.utcfromtimestamp(hour_key * 3600).strftime('%Y-%m-%d %H:00')
+            hour_label_cache[hour_key] = hour
+        hour_stats = hourly_stats.setdefault(hour, {'count': 0, 'completed': 0, 'failed': 0})
+        hour_stats['count'] += 1
+        if status == 'COMPLETED':
+            hour_stats['completed'] += 1
+        elif status == 'FAILED':
+            hour_stats['failed'] += 1
+
     total_size_mb = total_size_bytes / (1024 * 1024)
-    
+
     # Calculate success rate
     success_rate = (completed_files / total_files * 100) if total_files > 0 else 0
-    
-    # Group by hour
-    hourly_stats = {}
-    for item in data:
-        timestamp = int(item.get('uploadTimestamp', 0))
-        hour = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:00')
-        
-        if hour not in hourly_stats:
-            hourly_stats[hour] = {'count': 0, 'completed': 0, 'failed': 0}
-        
-        hourly_stats[hour]['count'] += 1
-        if item.get('processingStatus') == 'COMPLETED':
-            hourly_stats[hour]['completed'] += 1
-        elif item.get('processingStatus') == 'FAILED':
-            hourly_stats[hour]['failed'] += 1
-    
-    # Collect error messages
-    errors = []
-    for item in data:
-        if item.get('processingStatus') == 'FAILED' and item.get('errorMessage'):
-            errors.append({
-                'fileName': item.get('fileName', 'Unknown'),
-                'error': item.get('errorMessage', 'No error message'),
-                'timestamp': datetime.fromtimestamp(int(item.get('uploadTimestamp', 0))).isoformat()
-            })
-    
+
     # Build report structure
     report = {
         'report_metadata': {
@@ -157,12 +385,10 @@ def generate_report(data, start_time, end_time):
         },
         'hourly_breakdown': hourly_stats,
         'errors': errors[:10],  # Limit to top 10 errors
-        'top_files': sorted(
-            [{'fileName': item.get('fileName'), 'recordCount': int(item.get('recordCount', 0))} 
-             for item in data if item.get('recordCount')],
-            key=lambda x: x['recordCount'],
-            reverse=True
-        )[:10]
+        'top_files': [
+            {'fileName': file_name, 'recordCount': count}
+            for count, _, file_name in sorted(top_heap, reverse=True)
+        ]
     }
     
     return report
@@ -174,86 +400,78 @@ def save_report_to_s3(report, timestamp):
     # Generate report key with date partitioning
     report_key = f"daily-reports/{timestamp.year}/{timestamp.month:02d}/{timestamp.day:02d}/report_{timestamp.strftime('%Y%m%d_%H%M%S')}.json"
     
-    # Convert Decimal to float for JSON serialization
-    report_json = json.dumps(report, indent=2, default=decimal_default)
-    
-    # Upload to S3
-    s3_client.put_object(
-        Bucket=REPORTS_BUCKET,
-        Key=report_key,
-        Body=report_json,
-        ContentType='application/json'
-    )
-    
-    print(f"Report saved to s3://{REPORTS_BUCKET}/{report_key}")
-    
+    report_json = gzip.compress(serialize_report(report), compresslevel=3)
+
     # Also save as HTML
     html_report = generate_html_report(report)
     html_key = report_key.replace('.json', '.html')
-    
-    s3_client.put_object(
-        Bucket=REPORTS_BUCKET,
-        Key=html_key,
-        Body=html_report,
-        ContentType='text/html'
-    )
-    
+
+    # The two objects are independent, so upload them concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        json_future = executor.submit(
+            s3_client.put_object,
+            Bucket=REPORTS_BUCKET,
+            Key=report_key,
+            Body=report_json,
+            ContentType='application/json',
+            ContentEncoding='gzip'
+        )
+        html_future = executor.submit(
+            s3_client.put_object,
+            Bucket=REPORTS_BUCKET,
+            Key=html_key,
+            Body=html_report,
+            ContentType='text/html'
+        )
+        json_future.result()
+        html_future.result()
+
+    print(f"Report saved to s3://{REPORTS_BUCKET}/{report_key}")
+
     return report_key
 
-def generate_html_report(report):
-    """
-    Generate HTML version of the report
-    """
-    summary = report['summary']
-    
-    html = f"""
+# Static report scaffolding is parsed once at import, so warm
+# invocations only pay for substituting the dynamic fields
+HTML_HEADER_TEMPLATE = Template("""
     <!DOCTYPE html>
     <html>
     <head>
         <title>Daily Data Processing Report</title>
         <style>
-            body {{ font-family: Arial, sans-serif; margin: 20px; }}
-            h1 {{ color: #333; }}
-            table {{ border-collapse: collapse; width: 100%; margin: 20px 0; }}
-            th, td {{ border: 1px solid #ddd; padding: 12px; text-align: left; }}
-            th {{ background-color: #4CAF50; color: white; }}
-            .success {{ color: green; font-weight: bold; }}
-            .error {{ color: red; font-weight: bold; }}
-            .metric {{ font-size: 24px; font-weight: bold; margin: 10px 0; }}
+            body { font-family: Arial, sans-serif; margin: 20px; }
+            h1 { color: #333; }
+            table { border-collapse: collapse; width: 100%; margin: 20px 0; }
+            th, td { border: 1px solid #ddd; padding: 12px; text-align: left; }
+            th { background-color: #4CAF50; color: white; }
+            .success { color: green; font-weight: bold; }
+            .error { color: red; font-weight: bold; }
+            .metric { font-size: 24px; font-weight: bold; margin: 10px 0; }
         </style>
     </head>
     <body>
         <h1>Daily Data Processing Report</h1>
-        <p><strong>Environment:</strong> {report['report_metadata']['environment']}</p>
-        <p><strong>Report Period:</strong> {report['report_metadata']['report_period_start']} to {report['report_metadata']['report_period_end']}</p>
-        
+        <p><strong>Environment:</strong> $environment</p>
+        <p><strong>Report Period:</strong> $period_start to $period_end</p>
+
         <h2>Summary</h2>
-        <div class="metric">Total Files: {summary['total_files_processed']}</div>
-        <div class="metric success">✓ Successful: {summary['successful_files']}</div>
-        <div class="metric error">✗ Failed: {summary['failed_files']}</div>
-        <div class="metric">Success Rate: {summary['success_rate_percent']}%</div>
-        <div class="metric">Total Records: {summary['total_records_processed']}</div>
-        <div class="metric">Total Data: {summary['total_data_size_mb']} MB</div>
-        
+        <div class="metric">Total Files: $total_files</div>
+        <div class="metric success">✓ Successful: $successful_files</div>
+        <div class="metric error">✗ Failed: $failed_files</div>
+        <div class="metric">Success Rate: $success_rate%</div>
+        <div class="metric">Total Records: $total_records</div>
+        <div class="metric">Total Data: $total_size_mb MB</div>
+
         <h2>Top Files by Record Count</h2>
         <table>
             <tr>
                 <th>File Name</th>
                 <th>Record Count</th>
             </tr>
-    """
-    
-    for file_info in report['top_files']:
-        html += f"""
-            <tr>
-                <td>{file_info['fileName']}</td>
-                <td>{file_info['recordCount']}</td>
-            </tr>
-        """
-    
-    html += """
+    """)
+
+HTML_ERRORS_HEADER = """
         </table>
-        
+
         <h2>Recent Errors</h2>
         <table>
             <tr>
@@ -262,23 +480,56 @@ def generate_html_report(report):
                 <th>Timestamp</th>
             </tr>
     """
-    
-    for error in report['errors']:
-        html += f"""
-            <tr>
-                <td>{error['fileName']}</td>
-                <td>{error['error']}</td>
-                <td>{error['timestamp']}</td>
-            </tr>
-        """
-    
-    html += """
+
+HTML_FOOTER = """
         </table>
     </body>
     </html>
     """
-    
-    return html
+
+def generate_html_report(report):
+    """
+    Generate HTML version of the report
+    """
+    summary = report['summary']
+    metadata = report['report_metadata']
+
+    # Collect fragments in a list and join once at the end; repeated
+    # string += is quadratic in the output size
+    parts = [HTML_HEADER_TEMPLATE.substitute(
+        environment=escape(str(metadata['environment'])),
+        period_start=escape(str(metadata['report_period_start'])),
+        period_end=escape(str(metadata['report_period_end'])),
+        total_files=summary['total_files_processed'],
+        successful_files=summary['successful_files'],
+        failed_files=summary['failed_files'],
+        success_rate=summary['success_rate_percent'],
+        total_records=summary['total_records_processed'],
+        total_size_mb=summary['total_data_size_mb']
+    )]
+
+    for file_info in report['top_files']:
+        parts.append(f"""
+            <tr>
+                <td>{escape(str(file_info['fileName']))}</td>
+                <td>{file_info['recordCount']}</td>
+            </tr>
+        """)
+
+    parts.append(HTML_ERRORS_HEADER)
+
+    for error in report['errors']:
+        parts.append(f"""
+            <tr>
+                <td>{escape(str(error['fileName']))}</td>
+                <td>{escape(str(error['error']))}</td>
+                <td>{escape(str(error['timestamp']))}</td>
+            </tr>
+        """)
+
+    parts.append(HTML_FOOTER)
+
+    return ''.join(parts)
 
 def send_notification(report, report_key):
     """
@@ -345,8 +596,23 @@ Please investigate immediately.
         Message=message
     )
 
+def serialize_report(report):
+    """
+    Serialize the report to pretty-printed JSON bytes, preferring the
+    C-implemented orjson over the pure-Python stdlib encoder
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            report,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+            default=decimal_default
+        )
+    return json.dumps(report, indent=2, default=decimal_default).encode('utf-8')
+
 def decimal_default(obj):
-    """Helper function to convert Decimal to float for JSON serialization"""
+    """Helper function to convert Decimal and datetime for JSON serialization"""
     if isinstance(obj, Decimal):
         return float(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
     raise TypeError
\ No newline at end of file
@@ -17,6 +17,10 @@ terraform {
       source  = "hashicorp/random"
       version = "~> 3.5"
     }
+    null = {
+      source  = "hashicorp/null"
+      version = "~> 3.2"
+    }
   }
 }
 
@@ -94,8 +98,13 @@ resource "aws_sqs_queue" "dlq" {
 }
 
 resource "aws_sqs_queue" "file_processing_queue" {
-  name                      = "${local.project_name}-file-processing-${var.environment}"
-  visibility_timeout_seconds = 300
+  name = "${local.project_name}-file-processing-${var.environment}"
+
+  # 6x the Lambda timeout (300 s) per AWS guidance for SQS event
+  # sources, so a full 100-message batch plus the 5 s batching window
+  # can never outlive the visibility window and get redelivered while
+  # still in flight
+  visibility_timeout_seconds = 1800
 
   redrive_policy = jsonencode({
     deadLetterTargetArn = aws_sqs_queue.dlq.arn
@@ -150,6 +159,29 @@ resource "aws_dynamodb_table" "file_metadata" {
     type = "S"
   }
 
+  attribute {
+    name = "day"
+    type = "S"
+  }
+
+  attribute {
+    name = "uploadTimestamp"
+    type = "N"
+  }
+
+  global_secondary_index {
+    name            = "ByDay"
+    hash_key        = "day"
+    range_key       = "uploadTimestamp"
+    projection_type = "ALL"
+  }
+
+  # Required by the reporter's export-to-S3 path (EXPORT_BUCKET):
+  # export_table_to_point_in_time refuses tables without PITR
+  point_in_time_recovery {
+    enabled = true
+  }
+
   tags = {
     Project = "EventDrivenPipeline"
   }
@@ -207,29 +239,57 @@ resource "aws_iam_role_policy" "lambda_processor_policy" {
 ############################
 # Lambda Processor
 ############################
+# Stage the function source together with its pip dependencies so the
+# zipped bundle actually contains what requirements.txt declares
+resource "null_resource" "processor_build" {
+  triggers = {
+    source_hash       = filesha256("${path.module}/lambda/processor/index.py")
+    requirements_hash = filesha256("${path.module}/lambda/processor/requirements.txt")
+  }
+
+  provisioner "local-exec" {
+    command = <<-EOT
+      rm -rf ${path.module}/builds/processor-staging
+      mkdir -p ${path.module}/builds/processor-staging
+      cp ${path.module}/lambda/processor/index.py ${path.module}/builds/processor-staging/
+      pip install --no-compile -r ${path.module}/lambda/processor/requirements.txt -t ${path.module}/builds/processor-staging
+    EOT
+  }
+}
+
 data "archive_file" "processor_zip" {
   type        = "zip"
-  source_dir  = "${path.module}/lambda/processor"
+  source_dir  = "${path.module}/builds/processor-staging"
   output_path = "${path.module}/builds/processor.zip"
+  depends_on  = [null_resource.processor_build]
 }
 
 resource "aws_lambda_function" "data_processor" {
-  function_name = "${local.project_name}-processor-${var.environment}"
-  filename      = data.archive_file.processor_zip.output_path
-  role          = aws_iam_role.lambda_processor_role.arn
-  handler       = "index.handler"
-  runtime       = "python3.11"
-  timeout       = 300
-  memory_size   = 512
+  function_name    = "${local.project_name}-processor-${var.environment}"
+  filename         = data.archive_file.processor_zip.output_path
+  source_code_hash = data.archive_file.processor_zip.output_base64sha256
+  role             = aws_iam_role.lambda_processor_role.arn
+  handler          = "index.handler"
+  runtime          = "python3.11"
+  timeout          = 300
+  memory_size      = 512
+
+  # pandas and pyarrow come from the AWS-managed SDK layer; bundling
+  # them ourselves would blow Lambda's 250 MB unzipped package limit
+  layers = [
+    "arn:aws:lambda:${var.aws_region}:336392948345:layer:AWSSDKPandas-Python311:5"
+  ]
 }
 
 ############################
 # SQS → Lambda Mapping
 ############################
 resource "aws_lambda_event_source_mapping" "sqs_to_lambda" {
-  event_source_arn = aws_sqs_queue.file_processing_queue.arn
-  function_name    = aws_lambda_function.data_processor.arn
-  batch_size       = 10
+  event_source_arn                   = aws_sqs_queue.file_processing_queue.arn
+  function_name                      = aws_lambda_function.data_processor.arn
+  batch_size                         = 100
+  maximum_batching_window_in_seconds = 5
+  function_response_types            = ["ReportBatchItemFailures"]
 }
 
 resource "aws_lambda_permission" "allow_sqs" {